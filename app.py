@@ -1,7 +1,9 @@
 # main.py
 import os
+import time
 import streamlit as st
 from cvbuilder import build_resume, markdown_to_docx, markdown_to_pdf, TEMPLATE_PREVIEWS
+from drafts import DraftStore
 import re
 
 # Load environment variables
@@ -107,6 +109,8 @@ if "selected_template" not in st.session_state:
     st.session_state.selected_template = "modern"
 if "show_input" not in st.session_state:
     st.session_state.show_input = True
+if "drafts" not in st.session_state:
+    st.session_state.drafts = DraftStore()
 
 
 def is_resume_content(text):
@@ -314,6 +318,10 @@ if st.session_state.show_input:
                                 "❌ Generated content seems too short. Please provide more detailed information."
                             )
                         else:
+                            st.session_state.drafts.commit(
+                                st.session_state.generated_resume,
+                                label=f"Generated ({st.session_state.selected_template})",
+                            )
                             st.session_state.show_input = False
                             st.success("✅ Resume generated successfully!")
                             st.rerun()
@@ -342,6 +350,46 @@ else:
     # Update session state if content changed
     if edited_resume != st.session_state.generated_resume:
         st.session_state.generated_resume = edited_resume
+        st.session_state.drafts.commit(edited_resume, label="Edited")
+
+    # Version History
+    drafts = st.session_state.drafts
+    if len(drafts) > 1:
+        with st.expander("🕘 Version History"):
+            history = {
+                v.id: f"v{v.id} · {v.label} · {time.strftime('%H:%M:%S', time.localtime(v.created_at))}"
+                for v in reversed(drafts.versions())
+            }
+            col_hist1, col_hist2 = st.columns([1, 1])
+            with col_hist1:
+                selected_version = st.selectbox(
+                    "Version:",
+                    options=list(history.keys()),
+                    format_func=lambda x: history[x],
+                    index=min(1, len(history) - 1),
+                    key="history_version",
+                )
+            with col_hist2:
+                compare_version = st.selectbox(
+                    "Compare with:",
+                    options=list(history.keys()),
+                    format_func=lambda x: history[x],
+                    key="history_compare",
+                )
+
+            diff_text = drafts.diff(selected_version, compare_version)
+            if diff_text:
+                st.code(diff_text, language="diff")
+            else:
+                st.info("No differences between the selected versions.")
+
+            if st.button(f"↩️ Restore v{selected_version}", key="restore_btn"):
+                st.session_state.generated_resume = drafts.get(selected_version)
+                drafts.commit(
+                    st.session_state.generated_resume,
+                    label=f"Restored v{selected_version}",
+                )
+                st.rerun()
 
     # Live Preview
     st.subheader("👀 Live Preview")
@@ -3,8 +3,22 @@ from agno.agent import Agent
 from agno.models.mistral import MistralChat
 import pypandoc
 from pdfitdown.pdfconversion import Converter
+import inspect
 import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from io import BytesIO
+from hedging import CallCancelled, run_hedged, stream_hedged
+from routing import (
+    MODEL_ROUTES,
+    SMALL_ROUTE_BUDGET,
+    choose_route,
+    is_valid_resume,
+    stats,
+)
 
 # Base instructions shared across all templates
 BASE_INSTRUCTIONS = """You are a professional CV builder agent creating a resume.
@@ -300,46 +314,502 @@ Git, Docker, AWS, Creative Problem Solving
 }
 
 
-def build_resume(api_key: str, input_text: str, template: str = "modern"):
+# Inputs at least this long are split into sections and generated in parallel
+PARALLEL_THRESHOLD_CHARS = 6000
+# Target size of a single chunk when a long section is split further
+SECTION_CHUNK_CHARS = 2500
+MAX_PARALLEL_CALLS = 6
+# Default deadline for a single LLM call, in seconds
+REQUEST_TIMEOUT_S = float(os.getenv("REQUEST_TIMEOUT_S", 120))
+
+# Resume sections in output order, with the standalone headings that mark them
+SECTION_HEADINGS = {
+    "header": ["contact", "contact information", "contact details", "personal details"],
+    "summary": [
+        "summary",
+        "professional summary",
+        "objective",
+        "career objective",
+        "about",
+        "about me",
+        "profile",
+        "professional profile",
+    ],
+    "skills": ["skills", "technical skills", "core competencies", "competencies"],
+    "experience": [
+        "experience",
+        "work experience",
+        "professional experience",
+        "employment",
+        "employment history",
+        "work history",
+    ],
+    "projects": ["projects", "key projects", "personal projects"],
+    "education": ["education", "academic background"],
+}
+# Common headings for sections the templates have no slot for; they only
+# need to be recognised so that their content isn't split away
+OTHER_SECTION_HEADINGS = [
+    "certifications",
+    "certificates",
+    "awards",
+    "honors",
+    "achievements",
+    "languages",
+    "interests",
+    "hobbies",
+    "publications",
+    "volunteering",
+    "volunteer experience",
+    "references",
+    "courses",
+    "training",
+    "activities",
+    "leadership",
+]
+SECTION_ORDER = ["header", "summary", "skills", "experience", "projects", "education"]
+
+# Section headings used by each template when sections are merged
+TEMPLATE_SECTIONS = {
+    "modern": {
+        "summary": "## Professional Summary",
+        "skills": "## Skills",
+        "experience": "## Work Experience",
+        "projects": "## Projects",
+        "education": "## Education",
+    },
+    "professional": {
+        "summary": "## OBJECTIVE",
+        "skills": "## CORE COMPETENCIES",
+        "experience": "## PROFESSIONAL EXPERIENCE",
+        "projects": "## KEY PROJECTS",
+        "education": "## EDUCATION",
+    },
+    "creative": {
+        "summary": "## 💡 About Me",
+        "skills": "## 🛠️ Technical Arsenal",
+        "experience": "## 💼 Experience Journey",
+        "projects": "## 🚀 Featured Projects",
+        "education": "## 🎓 Education",
+    },
+}
+
+SECTION_INSTRUCTIONS = """🧩 **Partial Generation**:
+You are generating ONLY part of a larger resume: {part}.
+- Follow the template structure above for this part only
+- Do not output the section heading or any horizontal lines (---)
+- Do not add headings for any other section
+- Keep every item from the input in this part"""
+
+
+def _make_agent(
+    api_key: str, template: str = "modern", extra_instructions=None, route="large"
+) -> Agent:
     prompt = TEMPLATES.get(template, TEMPLATES["modern"])
 
-    agent = Agent(
+    return Agent(
         model=MistralChat(
-            name="llama3-70b-8192",
+            name=MODEL_ROUTES[route]["name"],
             api_key=api_key,
-            temperature=0.2,
+            temperature=MODEL_ROUTES[route]["temperature"],
         ),
-        instructions=[prompt],
+        instructions=[prompt] + (extra_instructions or []),
         markdown=True,
     )
-    return agent.run(input_text).content
 
 
-def markdown_to_docx(markdown_content: str) -> bytes:
-    output_path = "resume.docx"
-    pypandoc.convert_text(
-        markdown_content,
-        "docx",
-        format="md",
-        outputfile=output_path,
-        extra_args=["--standalone"],
+def _remaining(deadline) -> float:
+    """Seconds left before the absolute ``deadline``, or TimeoutError."""
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("Resume generation deadline exceeded")
+    return remaining
+
+
+def _run_agent(
+    api_key: str,
+    template: str,
+    input_text: str,
+    extra_instructions=None,
+    deadline=None,
+    hedge=True,
+    route="large",
+    kind="resume",
+    cancel=None,
+) -> str:
+    """Run one LLM call with whatever time is left before ``deadline``."""
+    timeout = _remaining(deadline)
+    # Each attempt gets its own agent so a hedge never shares run state
+    try:
+        response = run_hedged(
+            lambda: _make_agent(api_key, template, extra_instructions, route).arun(
+                input_text
+            ),
+            stats.latency[route][kind],
+            timeout=timeout,
+            hedge=hedge,
+            cancel=cancel,
+        )
+    except TimeoutError:
+        raise TimeoutError("Resume generation deadline exceeded") from None
+    return response.content
+
+
+def _route_for(input_text: str, template: str) -> str:
+    sections = split_sections(input_text).keys() - {"header"}
+    return choose_route(template, len(input_text), len(sections))
+
+
+def _run_routed(api_key: str, template: str, input_text: str, deadline, hedge) -> str:
+    """Run on the routed model, escalating to the large one on failure.
+
+    The small model fails over if it errors, times out or returns output
+    that doesn't pass validation; the large model then gets the rest of
+    the deadline.
+    """
+    if _route_for(input_text, template) == "small":
+        small_deadline = time.monotonic() + _remaining(deadline) * SMALL_ROUTE_BUDGET
+        try:
+            content = _run_agent(
+                api_key,
+                template,
+                input_text,
+                deadline=small_deadline,
+                hedge=hedge,
+                route="small",
+            )
+        except Exception:
+            content = None
+        if content is not None and is_valid_resume(content):
+            stats.record("small")
+            return content
+        stats.record("small", valid=False, escalated=True)
+
+    try:
+        content = _run_agent(
+            api_key, template, input_text, deadline=deadline, hedge=hedge
+        )
+    except Exception:
+        stats.record("large", valid=False)
+        raise
+    stats.record("large", valid=is_valid_resume(content))
+    return content
+
+
+def _heading_text(line: str):
+    """Return the text of a standalone heading line, or None.
+
+    A standalone heading is a Markdown ``#`` line, a line wrapped in
+    ``**``, a ``Heading:`` line with nothing after the colon, or a bare
+    line holding only a known heading. Bullets and ``key: value`` lines
+    are never headings.
+    """
+    line = line.strip()
+    if line.startswith("#"):
+        return line.lstrip("#").strip().strip("*").rstrip(":").strip() or None
+    if not line or line.startswith(("-", "*", "•")) and not line.startswith("**"):
+        return None
+    bold = line.startswith("**") and line.rstrip(":").endswith("**")
+    text = line.strip("*").strip()
+    colon = text.endswith(":")
+    if colon:
+        text = text[:-1].strip().rstrip("*").strip()
+    if not text or ":" in text or "*" in text or len(text.split()) > 4:
+        return None
+    if bold or colon or _known_heading(text) is not None:
+        return text
+    return None
+
+
+def _known_heading(text: str):
+    """Return the section for a heading's text, "other" or None."""
+    text = text.lower()
+    for section, headings in SECTION_HEADINGS.items():
+        if text in headings:
+            return section
+    if text in OTHER_SECTION_HEADINGS:
+        return "other"
+    return None
+
+
+def _section_for_heading(line: str):
+    """Return the section a line introduces, or None if it isn't a heading.
+
+    Headings that don't map to a template section return "other".
+    """
+    heading = _heading_text(line)
+    if heading is None:
+        return None
+    return _known_heading(heading) or "other"
+
+
+def has_unknown_headings(input_text: str) -> bool:
+    """True if the input has sections the templates have no slot for.
+
+    >>> has_unknown_headings("Jane Doe\\nEducation\\nBSc\\nCertifications\\nAWS")
+    True
+    >>> has_unknown_headings("Jane Doe\\n## Education\\nBSc\\n**Languages**\\nFrench")
+    True
+    >>> has_unknown_headings("Jane Doe\\nEducation:\\nBSc\\n# Awards\\nDean's list")
+    True
+    >>> has_unknown_headings("# Jane Doe\\n## Projects\\n**Technologies:** React")
+    False
+    """
+    return "other" in split_sections(input_text)
+
+
+def split_sections(input_text: str) -> dict:
+    """Group raw input lines by the resume section they belong to.
+
+    Lines before the first heading are treated as the header (name and
+    contact details); the first non-empty line is always the name, even
+    if it looks like a heading. Content under headings the templates have
+    no slot for is grouped as "other", and ``_use_parallel`` avoids
+    splitting inputs that have it.
+    """
+    sections = {}
+    current = "header"
+    name_seen = False
+    for line in input_text.splitlines():
+        section = _section_for_heading(line) if name_seen else None
+        name_seen = name_seen or bool(line.strip())
+        if section:
+            current = section
+        sections.setdefault(current, []).append(line)
+    return {
+        section: "\n".join(lines).strip()
+        for section, lines in sections.items()
+        if "\n".join(lines).strip()
+    }
+
+
+def _chunk_section(text: str) -> list:
+    """Split a section on blank lines into chunks of about SECTION_CHUNK_CHARS."""
+    chunks, current = [], ""
+    for block in re.split(r"\n\s*\n", text):
+        if current and len(current) + len(block) > SECTION_CHUNK_CHARS:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{block}" if current else block
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _clean_chunk(content: str, heading: str) -> str:
+    """Drop stray headings and rules the model adds around a partial section."""
+    lines = content.strip().splitlines()
+    while lines and lines[0].strip() in ("---", heading, ""):
+        lines.pop(0)
+    while lines and lines[-1].strip() in ("---", ""):
+        lines.pop()
+    return "\n".join(lines)
+
+
+def _generate_part(
+    api_key: str, template: str, part: str, text: str, deadline, hedge, cancel
+) -> str:
+    # Chunks still queued when the deadline passes fail here without a call
+    try:
+        content = _run_agent(
+            api_key,
+            template,
+            text,
+            [SECTION_INSTRUCTIONS.format(part=part)],
+            deadline=deadline,
+            hedge=hedge,
+            kind="chunk",
+            cancel=cancel,
+        )
+    except CallCancelled:
+        raise
+    except Exception:
+        stats.record("large", kind="chunk", valid=False)
+        raise
+    stats.record("large", kind="chunk", valid=bool(content and content.strip()))
+    return content
+
+
+def _generate_sections(
+    api_key: str, input_text: str, template: str, deadline, hedge
+):
+    """Generate each section in parallel and yield them in template order."""
+    headings = TEMPLATE_SECTIONS.get(template, TEMPLATE_SECTIONS["modern"])
+    sections = split_sections(input_text)
+
+    executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL_CALLS)
+    cancel = threading.Event()
+    try:
+        futures = []
+        for section in SECTION_ORDER:
+            if section not in sections:
+                continue
+            if section == "header":
+                part = "the name line and contact details at the top"
+                chunks = [sections[section]]
+            else:
+                part = f"the entries of the '{headings[section]}' section"
+                # Skills are categorised across the whole list, so keep them together
+                if section in ("summary", "skills"):
+                    chunks = [sections[section]]
+                else:
+                    chunks = _chunk_section(sections[section])
+            futures.append(
+                (
+                    section,
+                    [
+                        executor.submit(
+                            _generate_part,
+                            api_key,
+                            template,
+                            part,
+                            chunk,
+                            deadline,
+                            hedge,
+                            cancel,
+                        )
+                        for chunk in chunks
+                    ],
+                )
+            )
+
+        # Sections are yielded in order, but any failed chunk aborts at once
+        pending = {
+            future for _, section_futures in futures for future in section_futures
+        }
+        for section, section_futures in futures:
+            while not all(future.done() for future in section_futures):
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is not None:
+                        raise future.exception()
+            heading = headings.get(section, "")
+            body = "\n\n".join(
+                _clean_chunk(future.result(), heading) for future in section_futures
+            )
+            yield body if section == "header" else f"{heading}\n\n{body}"
+    finally:
+        # Stop in-flight chunk calls and drop queued ones when generation
+        # fails or is abandoned (this is a no-op once every chunk is done)
+        cancel.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _use_parallel(input_text: str) -> bool:
+    if len(input_text) < PARALLEL_THRESHOLD_CHARS:
+        return False
+    # Sections the splitter can't place would be dropped by partial prompts
+    if has_unknown_headings(input_text):
+        return False
+    return len(split_sections(input_text).keys() - {"header"}) >= 2
+
+
+def build_resume(
+    api_key: str,
+    input_text: str,
+    template: str = "modern",
+    timeout=REQUEST_TIMEOUT_S,
+    hedge=True,
+):
+    """Generate a resume, finishing within ``timeout`` seconds overall."""
+    deadline = time.monotonic() + timeout
+    if _use_parallel(input_text):
+        return "\n\n---\n\n".join(
+            _generate_sections(api_key, input_text, template, deadline, hedge)
+        )
+
+    return _run_routed(api_key, template, input_text, deadline, hedge)
+
+
+async def _agent_stream(agent: Agent, input_text: str):
+    """Yield content from a streamed agent run, closing it when done."""
+    stream = agent.arun(input_text, stream=True)
+    if inspect.isawaitable(stream):
+        stream = await stream
+    try:
+        async for chunk in stream:
+            content = getattr(chunk, "content", None)
+            if content:
+                yield content
+    finally:
+        aclose = getattr(stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+def stream_resume(
+    api_key: str, input_text: str, template: str = "modern", timeout=REQUEST_TIMEOUT_S
+):
+    """Yield the generated resume as Markdown chunks as they arrive.
+
+    Inputs routed to the small model are generated in one piece so invalid
+    output can still be escalated before anything is sent. Streams from
+    the large model are hedged on time to first chunk. Raises
+    ``TimeoutError`` if the whole resume isn't done within ``timeout``
+    seconds, including when the upstream stalls between chunks.
+    """
+    deadline = time.monotonic() + timeout
+    if _use_parallel(input_text):
+        sections = _generate_sections(api_key, input_text, template, deadline, True)
+        for i, section in enumerate(sections):
+            yield section if i == 0 else f"\n\n---\n\n{section}"
+        return
+
+    if _route_for(input_text, template) == "small":
+        yield _run_routed(api_key, template, input_text, deadline, True)
+        return
+
+    start = time.monotonic()
+    content = ""
+    chunks = stream_hedged(
+        lambda: _agent_stream(_make_agent(api_key, template), input_text),
+        stats.latency["large"]["first_chunk"],
+        timeout=_remaining(deadline),
     )
-    with open(output_path, "rb") as f:
-        file_bytes = f.read()
-    os.remove(output_path)
+    try:
+        for chunk in chunks:
+            content += chunk
+            yield chunk
+    except TimeoutError:
+        # Censored sample: the stream ran at least this long
+        stats.latency["large"]["resume"].record(time.monotonic() - start)
+        stats.record("large", valid=False)
+        raise TimeoutError("Resume generation deadline exceeded") from None
+    except Exception:
+        stats.record("large", valid=False)
+        raise
+    stats.latency["large"]["resume"].record(time.monotonic() - start)
+    stats.record("large", valid=is_valid_resume(content))
+
+
+def markdown_to_docx(markdown_content: str) -> bytes:
+    # Work in a private directory so concurrent conversions don't collide
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, "resume.docx")
+        pypandoc.convert_text(
+            markdown_content,
+            "docx",
+            format="md",
+            outputfile=output_path,
+            extra_args=["--standalone"],
+        )
+        with open(output_path, "rb") as f:
+            file_bytes = f.read()
     return BytesIO(file_bytes)
 
 
 def markdown_to_pdf(markdown_content: str) -> bytes:
-    with open("resume.md", "w", encoding="utf-8") as f:
-        f.write(markdown_content)
-
-    converter = Converter()
-    converter.convert(file_path="resume.md", output_path="resume.pdf")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        md_path = os.path.join(tmp_dir, "resume.md")
+        pdf_path = os.path.join(tmp_dir, "resume.pdf")
+        with open(md_path, "w", encoding="utf-8") as f:
+            f.write(markdown_content)
 
-    with open("resume.pdf", "rb") as f:
-        file_bytes = f.read()
+        converter = Converter()
+        converter.convert(file_path=md_path, output_path=pdf_path)
 
-    os.remove("resume.md")
-    os.remove("resume.pdf")
+        with open(pdf_path, "rb") as f:
+            file_bytes = f.read()
     return BytesIO(file_bytes)
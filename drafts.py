@@ -0,0 +1,156 @@
+# drafts.py
+import difflib
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass
+class DraftVersion:
+    id: int
+    label: str
+    created_at: float = field(default_factory=time.time)
+    # Either the full text, or a line-level delta against the previous
+    # version: (start, end, replacement)
+    snapshot: str = None
+    delta: tuple = ()
+    size: int = 0
+
+
+def _split(text: str) -> list:
+    return text.splitlines(keepends=True)
+
+
+def _make_delta(base_lines: list, lines: list) -> tuple:
+    matcher = difflib.SequenceMatcher(None, base_lines, lines, autojunk=False)
+    return tuple(
+        (i1, i2, tuple(lines[j1:j2]))
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != "equal"
+    )
+
+
+def _apply_delta(base_lines: list, delta: tuple) -> str:
+    out = []
+    pos = 0
+    for i1, i2, replacement in delta:
+        out.extend(base_lines[pos:i1])
+        out.extend(replacement)
+        pos = i2
+    out.extend(base_lines[pos:])
+    return "".join(out)
+
+
+def _delta_size(delta: tuple) -> int:
+    return sum(len(line) for _, _, replacement in delta for line in replacement)
+
+
+class DraftStore:
+    """Per-session history of resume drafts.
+
+    Each version is stored as a line delta against the version before it,
+    with a full snapshot at least every ``snapshot_every`` versions, and
+    whenever the delta would be larger than half the text (for example
+    after regenerating with another template). Memory is bounded by
+    ``max_versions`` and ``max_chars`` (all snapshots and delta payloads);
+    the oldest versions are evicted first.
+    """
+
+    def __init__(
+        self, max_versions: int = 30, max_chars: int = 200_000, snapshot_every: int = 10
+    ):
+        self.max_versions = max_versions
+        self.max_chars = max_chars
+        self.snapshot_every = snapshot_every
+        self._versions = []
+        self._latest_text = None
+        self._since_snapshot = 0
+        self._next_id = 1
+
+    def __len__(self):
+        return len(self._versions)
+
+    @property
+    def latest_id(self):
+        return self._versions[-1].id if self._versions else None
+
+    def commit(self, text: str, label: str = "Edited") -> int:
+        """Record ``text`` as a new version and return its id.
+
+        Committing content identical to the latest version is a no-op that
+        returns the latest id.
+        """
+        if self._versions and self._latest_text == text:
+            return self.latest_id
+
+        version = DraftVersion(id=self._next_id, label=label)
+        delta = None
+        if self._versions and self._since_snapshot < self.snapshot_every:
+            delta = _make_delta(_split(self._latest_text), _split(text))
+            if _delta_size(delta) > len(text) / 2:
+                delta = None
+
+        if delta is None:
+            version.snapshot = text
+            version.size = len(text)
+            self._since_snapshot = 1
+        else:
+            version.delta = delta
+            version.size = _delta_size(delta)
+            self._since_snapshot += 1
+
+        self._next_id += 1
+        self._versions.append(version)
+        self._latest_text = text
+        self._enforce_limits()
+        return version.id
+
+    def get(self, version_id: int) -> str:
+        index = self._index(version_id)
+        # Walk back to the nearest snapshot, then replay deltas forward
+        start = index
+        while self._versions[start].snapshot is None:
+            start -= 1
+        text = self._versions[start].snapshot
+        for version in self._versions[start + 1 : index + 1]:
+            text = _apply_delta(_split(text), version.delta)
+        return text
+
+    def versions(self) -> list:
+        """Return retained versions, oldest first."""
+        return list(self._versions)
+
+    def diff(self, from_id: int, to_id: int) -> str:
+        """Unified diff between two retained versions."""
+        return "".join(
+            difflib.unified_diff(
+                _split(self.get(from_id)),
+                _split(self.get(to_id)),
+                fromfile=f"v{from_id}",
+                tofile=f"v{to_id}",
+            )
+        )
+
+    def total_chars(self) -> int:
+        return sum(v.size for v in self._versions)
+
+    def _index(self, version_id: int) -> int:
+        for index, version in enumerate(self._versions):
+            if version.id == version_id:
+                return index
+        raise KeyError(f"Unknown draft version: {version_id}")
+
+    def _enforce_limits(self):
+        while len(self._versions) > 1 and (
+            len(self._versions) > self.max_versions
+            or self.total_chars() > self.max_chars
+        ):
+            self._drop_oldest()
+
+    def _drop_oldest(self):
+        # The next version becomes the oldest, so it must hold a full snapshot
+        successor = self._versions[1]
+        if successor.snapshot is None:
+            successor.snapshot = self.get(successor.id)
+            successor.delta = ()
+            successor.size = len(successor.snapshot)
+        self._versions.pop(0)
@@ -0,0 +1,276 @@
+# hedging.py
+import asyncio
+import inspect
+import queue
+import threading
+import time
+from collections import deque
+
+# Issue a duplicate call once the first has run longer than this percentile
+HEDGE_PERCENTILE = 95
+# Recent latencies needed before hedging starts
+HEDGE_MIN_SAMPLES = 20
+# Upper bound on the share of recent calls that may be hedged
+MAX_HEDGE_RATE = 0.1
+# How often a running call checks its cancel event, in seconds
+CANCEL_POLL_S = 0.05
+
+
+class CallCancelled(Exception):
+    """Raised when a call is abandoned through its cancel event."""
+
+
+class LatencyTracker:
+    """Rolling window of recent call latencies, in seconds."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * p / 100))
+        return samples[index]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class HedgeBudget:
+    """Caps the fraction of recent calls that issued a hedge."""
+
+    def __init__(self, max_rate: float = MAX_HEDGE_RATE, window: int = 100):
+        self.max_rate = max_rate
+        self._calls = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record_call(self, hedged: bool):
+        with self._lock:
+            self._calls.append(hedged)
+
+    def allows_hedge(self) -> bool:
+        with self._lock:
+            return (sum(self._calls) + 1) / (len(self._calls) + 1) <= self.max_rate
+
+
+budget = HedgeBudget()
+
+
+def hedge_delay(tracker: LatencyTracker):
+    if len(tracker) < HEDGE_MIN_SAMPLES:
+        return None
+    return tracker.percentile(HEDGE_PERCENTILE)
+
+
+async def _timed(make_call, tracker, censor: bool):
+    start = time.monotonic()
+    try:
+        result = await make_call()
+    except asyncio.CancelledError:
+        # A primary attempt cut off by the deadline or a hedge ran at least
+        # this long; record the censored sample so the tail isn't biased low.
+        # Hedge losers started late, so their elapsed time says nothing.
+        if censor:
+            tracker.record(time.monotonic() - start)
+        raise
+    tracker.record(time.monotonic() - start)
+    return result
+
+
+async def _wait_cancelled(cancel):
+    while not cancel.is_set():
+        await asyncio.sleep(CANCEL_POLL_S)
+
+
+async def _run_hedged(make_call, timeout, hedge, tracker, cancel):
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    def remaining():
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    hedged = False
+    pending = {asyncio.ensure_future(_timed(make_call, tracker, censor=True))}
+    watcher = asyncio.ensure_future(_wait_cancelled(cancel)) if cancel else None
+    try:
+        delay = hedge_delay(tracker) if hedge else None
+        # A hedge that would only start at the deadline is wasted
+        if delay is not None and (deadline is None or delay < remaining()):
+            done, pending = await asyncio.wait(
+                pending | {watcher} - {None}, timeout=delay
+            )
+            pending.discard(watcher)
+            if watcher in done:
+                raise CallCancelled("LLM call cancelled")
+            if not done and budget.allows_hedge():
+                hedged = True
+                pending.add(
+                    asyncio.ensure_future(_timed(make_call, tracker, censor=False))
+                )
+            pending |= done
+
+        while pending:
+            done, pending = await asyncio.wait(
+                pending | {watcher} - {None},
+                timeout=remaining(),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            pending.discard(watcher)
+            if watcher in done:
+                raise CallCancelled("LLM call cancelled")
+            if not done:
+                raise TimeoutError(f"LLM call timed out after {timeout:g}s")
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+            # Every finished attempt failed; keep waiting on any still running
+            if not pending:
+                return done.pop().result()
+    finally:
+        budget.record_call(hedged)
+        for task in pending | {watcher} - {None}:
+            task.cancel()
+
+
+def run_hedged(
+    make_call, tracker: LatencyTracker, timeout=None, hedge=True, cancel=None
+):
+    """Run the coroutine returned by ``make_call`` under a deadline.
+
+    If hedging is enabled and the call is still running after the tracked
+    latency percentile, a duplicate is started (subject to the hedge
+    budget) and whichever finishes first wins; the other is cancelled.
+    Raises ``TimeoutError`` if no attempt finishes within ``timeout``
+    seconds. Latencies are recorded in ``tracker``. Setting the optional
+    ``cancel`` event from another thread cancels the running attempts and
+    raises ``CallCancelled``.
+    """
+    return asyncio.run(_run_hedged(make_call, timeout, hedge, tracker, cancel))
+
+
+_STREAM_END = object()
+
+
+async def _pump_attempt(make_stream, attempt: int, out: queue.Queue):
+    """Copy one streamed attempt into ``out`` as (attempt, item) pairs."""
+    try:
+        stream = make_stream()
+        if inspect.isawaitable(stream):
+            stream = await stream
+        try:
+            async for text in stream:
+                out.put((attempt, text))
+        finally:
+            # Closing the stream releases the upstream response on cancel
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        out.put((attempt, _STREAM_END))
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        out.put((attempt, e))
+
+
+def _run_loop(loop):
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+    # Let cancelled attempts unwind so their streams get closed
+    tasks = asyncio.all_tasks(loop)
+    loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+    loop.close()
+
+
+def stream_hedged(make_stream, tracker: LatencyTracker, timeout=None, hedge=True):
+    """Yield text from the async iterator returned by ``make_stream``.
+
+    The streaming counterpart of ``run_hedged``: ``tracker`` holds
+    time-to-first-chunk latencies, and if no chunk has arrived by the
+    tracked percentile a duplicate stream is started (subject to the hedge
+    budget). The first attempt to produce a chunk wins, and the other is
+    cancelled and its stream closed. Raises ``TimeoutError`` if the whole
+    stream isn't done within ``timeout`` seconds.
+    """
+    start = time.monotonic()
+    deadline = None if timeout is None else start + timeout
+
+    def remaining():
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    out = queue.Queue()
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=_run_loop, args=(loop,), daemon=True).start()
+    attempts = []
+
+    def launch():
+        attempts.append(
+            asyncio.run_coroutine_threadsafe(
+                _pump_attempt(make_stream, len(attempts), out), loop
+            )
+        )
+
+    launch()
+    hedged = False
+    try:
+        delay = hedge_delay(tracker) if hedge else None
+        # A hedge that would only start at the deadline is wasted
+        hedge_at = None
+        if delay is not None and (deadline is None or start + delay < deadline):
+            hedge_at = start + delay
+
+        # Wait for the first chunk from any attempt
+        failed = 0
+        while True:
+            wait_for = remaining()
+            if hedge_at is not None:
+                until_hedge = max(0.0, hedge_at - time.monotonic())
+                wait_for = (
+                    until_hedge if wait_for is None else min(wait_for, until_hedge)
+                )
+            try:
+                winner, item = out.get(timeout=wait_for)
+            except queue.Empty:
+                if hedge_at is not None and time.monotonic() >= hedge_at:
+                    hedge_at = None
+                    if budget.allows_hedge():
+                        hedged = True
+                        launch()
+                    continue
+                # Censored sample: the primary produced nothing this long
+                tracker.record(time.monotonic() - start)
+                raise TimeoutError(f"LLM stream timed out after {timeout:g}s")
+            if isinstance(item, Exception):
+                failed += 1
+                # Keep waiting while another attempt is still running
+                if failed == len(attempts):
+                    raise item
+                continue
+            break
+
+        tracker.record(time.monotonic() - start)
+        for attempt, future in enumerate(attempts):
+            if attempt != winner:
+                future.cancel()
+
+        while item is not _STREAM_END:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+            while True:
+                try:
+                    attempt, item = out.get(timeout=remaining())
+                except queue.Empty:
+                    raise TimeoutError(f"LLM stream timed out after {timeout:g}s")
+                if attempt == winner:
+                    break
+    finally:
+        budget.record_call(hedged)
+        for future in attempts:
+            future.cancel()
+        loop.call_soon_threadsafe(loop.stop)
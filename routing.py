@@ -0,0 +1,98 @@
+# routing.py
+import re
+import threading
+from hedging import LatencyTracker
+
+# Model configuration for each route
+MODEL_ROUTES = {
+    "small": {"name": "mistral-small-latest", "temperature": 0.2},
+    "large": {"name": "llama3-70b-8192", "temperature": 0.2},
+}
+
+# Share of the remaining deadline given to the small model, so the large
+# model still has time to take over if the small one fails
+SMALL_ROUTE_BUDGET = 0.5
+
+# Kinds of LLM call, tracked separately since their latencies differ widely:
+# a full resume, or one section chunk of a parallel generation
+CALL_KINDS = ("resume", "chunk")
+# Latency is also tracked for time to first chunk of a streamed resume
+LATENCY_KINDS = CALL_KINDS + ("first_chunk",)
+
+# Per-template limits under which the small model is used
+TEMPLATE_ROUTING = {
+    "modern": {"max_small_chars": 2500, "max_small_sections": 4},
+    "professional": {"max_small_chars": 2500, "max_small_sections": 4},
+    # Emoji-heavy layout is harder to follow, so escalate sooner
+    "creative": {"max_small_chars": 1500, "max_small_sections": 3},
+}
+
+
+def choose_route(template: str, input_chars: int, section_count: int) -> str:
+    """Pick the model route for an input of the given size and shape."""
+    limits = TEMPLATE_ROUTING.get(template, TEMPLATE_ROUTING["modern"])
+    if (
+        input_chars <= limits["max_small_chars"]
+        and section_count <= limits["max_small_sections"]
+    ):
+        return "small"
+    return "large"
+
+
+def is_valid_resume(content: str) -> bool:
+    """Cheap structural check on a generated resume."""
+    if not content or len(content.strip()) < 100:
+        return False
+    if "```" in content:
+        return False
+    return bool(
+        re.search(r"^# \S", content, re.MULTILINE)
+        and re.search(r"^## \S", content, re.MULTILINE)
+    )
+
+
+class RouteStats:
+    """Per-route call counts, escalations and attempt latencies by call kind."""
+
+    def __init__(self):
+        self.latency = {
+            route: {kind: LatencyTracker() for kind in LATENCY_KINDS}
+            for route in MODEL_ROUTES
+        }
+        self._counts = {
+            route: {
+                kind: {"calls": 0, "failures": 0, "escalations": 0}
+                for kind in CALL_KINDS
+            }
+            for route in MODEL_ROUTES
+        }
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        route: str,
+        kind: str = "resume",
+        valid: bool = True,
+        escalated: bool = False,
+    ):
+        with self._lock:
+            counts = self._counts[route][kind]
+            counts["calls"] += 1
+            counts["failures"] += not valid
+            counts["escalations"] += escalated
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            snapshot = {
+                route: {kind: dict(c) for kind, c in kinds.items()}
+                for route, kinds in self._counts.items()
+            }
+        for route, trackers in self.latency.items():
+            for kind, tracker in trackers.items():
+                snapshot[route].setdefault(kind, {})
+                snapshot[route][kind]["p50_s"] = tracker.percentile(50)
+                snapshot[route][kind]["p95_s"] = tracker.percentile(95)
+        return snapshot
+
+
+stats = RouteStats()
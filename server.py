@@ -0,0 +1,168 @@
+# server.py
+import os
+from typing import Optional
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from cvbuilder import (
+    REQUEST_TIMEOUT_S,
+    TEMPLATES,
+    markdown_to_docx,
+    markdown_to_pdf,
+    stream_resume,
+)
+from routing import stats
+
+# Load environment variables
+load_dotenv()
+
+api_key = os.getenv("AGENT_API_KEY")
+
+# Service limits
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", 64 * 1024))
+MAX_INPUT_CHARS = int(os.getenv("MAX_INPUT_CHARS", 30_000))
+MAX_TIMEOUT_S = float(os.getenv("MAX_TIMEOUT_S", 300))
+
+# Appended to a streamed resume when generation fails after the first chunk
+STREAM_ERROR_MARKER = "<!-- generation-error:"
+
+app = FastAPI(title="AI CV Builder", version="1.0.0")
+
+
+class ResumeRequest(BaseModel):
+    input_text: str = Field(..., min_length=20, max_length=MAX_INPUT_CHARS)
+    template: str = "modern"
+    # Per-request deadline in seconds; defaults to REQUEST_TIMEOUT_S
+    timeout: Optional[float] = Field(None, gt=0, le=MAX_TIMEOUT_S)
+
+
+class ExportRequest(BaseModel):
+    markdown: str = Field(..., min_length=1, max_length=MAX_INPUT_CHARS)
+
+
+class RequestSizeLimit:
+    """Reject request bodies larger than ``max_bytes`` with a 413.
+
+    The body is read and counted before the app sees it, so the limit also
+    holds for chunked requests that carry no ``Content-Length`` header.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if len(body) > self.max_bytes:
+                response = JSONResponse(
+                    status_code=413,
+                    content={"detail": f"Request body exceeds {self.max_bytes} bytes"},
+                )
+                return await response(scope, receive, send)
+
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        await self.app(scope, replay, send)
+
+
+app.add_middleware(RequestSizeLimit, max_bytes=MAX_REQUEST_BYTES)
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "agent_configured": bool(api_key)}
+
+
+@app.get("/stats")
+def route_stats():
+    # Stats are kept per worker process
+    return {"routes": stats.snapshot()}
+
+
+def _with_error_marker(first: str, chunks):
+    """Stream ``chunks``, ending with an error marker if generation fails."""
+    yield first
+    try:
+        yield from chunks
+    except Exception as e:
+        yield f"\n\n{STREAM_ERROR_MARKER} {type(e).__name__}: {e} -->\n"
+
+
+@app.post("/resume")
+def generate_resume(body: ResumeRequest):
+    if not api_key:
+        raise HTTPException(status_code=503, detail="AGENT_API_KEY is not set")
+    if body.template not in TEMPLATES:
+        raise HTTPException(
+            status_code=422, detail=f"Unknown template: {body.template}"
+        )
+
+    chunks = stream_resume(
+        api_key=api_key,
+        input_text=body.input_text,
+        template=body.template,
+        timeout=body.timeout or REQUEST_TIMEOUT_S,
+    )
+    # Pull the first chunk before the status line is sent so that upstream
+    # failures and timeouts surface as error responses, not truncated bodies
+    try:
+        first = next(chunks, "")
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Generation failed: {e}")
+
+    return StreamingResponse(
+        _with_error_marker(first, chunks),
+        media_type="text/markdown; charset=utf-8",
+    )
+
+
+@app.post("/export/pdf")
+async def export_pdf(body: ExportRequest):
+    resume_file = await run_in_threadpool(markdown_to_pdf, body.markdown)
+    return Response(
+        content=resume_file.getvalue(),
+        media_type="application/pdf",
+        headers={"Content-Disposition": 'attachment; filename="resume.pdf"'},
+    )
+
+
+@app.post("/export/docx")
+async def export_docx(body: ExportRequest):
+    resume_file = await run_in_threadpool(markdown_to_docx, body.markdown)
+    return Response(
+        content=resume_file.getvalue(),
+        media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        headers={"Content-Disposition": 'attachment; filename="resume.docx"'},
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "server:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", 8000)),
+        workers=int(os.getenv("WORKERS", os.cpu_count() or 1)),
+    )